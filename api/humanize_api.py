@@ -1,12 +1,11 @@
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel, Field
 from typing import Optional
-import re
 
 # Import processing helpers from the existing Streamlit page
 from pages.humanize_text import (
     extract_citations,
-    restore_citations,
+    finalize_output,
     minimal_rewriting,
     preserve_linebreaks_rewrite,
     count_words,
@@ -124,13 +123,8 @@ def humanize(req: HumanizeRequest):
     else:
         rewritten = minimal_rewriting(no_refs_text, p_syn=req.p_syn, p_trans=req.p_trans)
 
-    # Restore citations and normalize spacing similar to Streamlit page
-    final_text = restore_citations(rewritten, placeholders)
-    final_text = re.sub(r"[ \t]+([.,;:!?])", r"\1", final_text)
-    final_text = re.sub(r"(\()[ \t]+", r"\1", final_text)
-    final_text = re.sub(r"[ \t]+(\))", r"\1", final_text)
-    final_text = re.sub(r"[ \t]{2,}", " ", final_text)
-    final_text = re.sub(r"``\s*(.+?)\s*''", r'"\1"', final_text)
+    # Restore citations and normalize spacing in one pass, as on the page
+    final_text = finalize_output(rewritten, placeholders)
 
     new_wc = count_words(final_text)
     new_sc = count_sentences(final_text)
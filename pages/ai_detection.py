@@ -1,11 +1,51 @@
 # pages/pdf_detection.py
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import streamlit as st
 import pandas as pd
 import altair as alt
 from utils.pdf_utils import extract_text_from_pdf, generate_annotated_pdf, word_count
-from utils.ai_detection_utils import classify_text_hf  # Defined in utils/ai_detection_utils.py
+from utils.ai_detection_utils import (  # Defined in utils/ai_detection_utils.py
+    classify_text_hf_stream,
+    percentages_from_map,
+)
 from io import BytesIO
 
+
+@st.cache_resource
+def _get_pdf_executor():
+    """Background worker pool shared by all sessions on this server."""
+    return ThreadPoolExecutor(max_workers=2)
+
+
+def _process_pdf(pdf_bytes, progress):
+    """Worker: extract, classify, and annotate one PDF off the event loop.
+
+    `progress` is a plain dict shared with the page, updated with the
+    current stage so polling reruns can show where the job is.
+    """
+    progress["stage"] = "📄 Extracting text from PDF..."
+    extracted = extract_text_from_pdf(pdf_bytes)
+    if not extracted.strip():
+        return {"text": "", "classification_map": None,
+                "percentages": None, "annotated": None}
+
+    c_map = {}
+    for batch_map, done, total in classify_text_hf_stream(extracted):
+        c_map.update(batch_map)
+        progress["stage"] = f"🤖 Classified {done}/{total} sentences..."
+
+    progress["stage"] = "🎨 Generating annotated PDF..."
+    annotated = generate_annotated_pdf(pdf_bytes, c_map)
+    return {
+        "text": extracted,
+        "classification_map": c_map,
+        "percentages": percentages_from_map(c_map),
+        "annotated": annotated,
+    }
+
+
 def show_pdf_detection_page():
     # Navigation buttons
     col1, col2 = st.columns([1, 1])
@@ -88,6 +128,8 @@ def show_pdf_detection_page():
         st.session_state["pdf_processed"] = False
     if "current_pdf_name" not in st.session_state:
         st.session_state["current_pdf_name"] = None
+    if "pdf_job" not in st.session_state:
+        st.session_state["pdf_job"] = None
 
     st.subheader("📁 Upload Your PDF Document")
     uploaded_pdf = st.file_uploader("Choose a PDF file", type=[
@@ -103,35 +145,50 @@ def show_pdf_detection_page():
         st.session_state["percentages"] = None
         st.session_state["annotated_pdf"] = None
         st.session_state["original_pdf_text"] = ""
+        st.session_state["pdf_job"] = None
 
     if uploaded_pdf:
         # Only process if not already processed
         if not st.session_state["pdf_processed"]:
-            pdf_bytes = uploaded_pdf.read()
-            with st.spinner("📄 Extracting text from PDF..."):
-                extracted = extract_text_from_pdf(pdf_bytes)
-                st.session_state["original_pdf_text"] = extracted
+            # Enqueue the heavy work on the shared executor and poll: the
+            # upload returns immediately and this session's reruns (and
+            # other sessions) are not blocked behind the processing.
+            job = st.session_state["pdf_job"]
+            if job is None:
+                pdf_bytes = uploaded_pdf.read()
+                progress = {"stage": "⏳ Queued for processing..."}
+                st.session_state["pdf_job_progress"] = progress
+                job = _get_pdf_executor().submit(
+                    _process_pdf, pdf_bytes, progress)
+                st.session_state["pdf_job"] = job
+
+            if not job.done():
+                with st.status("🔍 Analyzing your PDF in the background...",
+                               expanded=True):
+                    st.write(st.session_state["pdf_job_progress"].get(
+                        "stage", "⏳ Working..."))
+                time.sleep(0.5)
+                st.rerun()
 
-            if not st.session_state["original_pdf_text"].strip():
+            results = job.result()
+            st.session_state["pdf_job"] = None
+
+            if not results["text"].strip():
                 st.error(
                     "❌ No text could be extracted from this PDF. Please ensure it contains selectable text.")
                 st.session_state["pdf_processed"] = False
                 return
 
-            with st.spinner("🤖 Analyzing content with AI detection..."):
-                c_map, pcts = classify_text_hf(
-                    st.session_state["original_pdf_text"])
-                st.session_state["classification_map"] = c_map
-                st.session_state["percentages"] = pcts
-
-            with st.spinner("🎨 Generating annotated PDF..."):
-                annotated = generate_annotated_pdf(
-                    pdf_bytes, st.session_state["classification_map"])
-                st.session_state["annotated_pdf"] = annotated
+            st.session_state["original_pdf_text"] = results["text"]
+            st.session_state["classification_map"] = results["classification_map"]
+            st.session_state["percentages"] = results["percentages"]
+            st.session_state["annotated_pdf"] = results["annotated"]
 
-            # Mark as processed to avoid re-running
+            # Mark as processed and fall through to the results blocks
+            # below in this same run: a rerun here would re-execute the
+            # whole script just to render what we already have in hand.
             st.session_state["pdf_processed"] = True
-            st.rerun()  # Refresh to show results without processing messages
+            st.success("✅ PDF analysis completed! Results are ready below.")
         else:
             # If already processed, just show the results
             st.success("✅ PDF analysis completed! Results are ready below.")
@@ -1,47 +1,142 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
 import nltk
+import streamlit as st
 from nltk.tokenize import sent_tokenize
 from utils.model_loaders import load_detector_model
 
 nltk.download('punkt', quiet=True)
 
-def classify_text_hf(text, threshold=0.8):
-    """
-    Splits text into sentences, uses roberta-base-openai-detector to classify each sentence
-    as AI-generated or human-written, returning a map of {sentence: label} and overall percentages.
+# Sentences per detector forward pass when streaming results
+_BATCH_SIZE = 32
+
+_CATEGORIES = (
+    "AI-generated",
+    "AI-generated & AI-refined",
+    "Human-written",
+    "Human-written & AI-refined",
+)
+
+
+class BatchedDetector:
+    """Coalesce detector calls from concurrent sessions into one forward.
+
+    Each caller enqueues its sentences with a Future; a single worker
+    thread drains whatever arrives within a short window (up to
+    `max_batch` sentences), runs one padded forward pass for all of it,
+    and slices the results back out per caller. Single-user latency is
+    bounded by the window; multi-user throughput rises because the model
+    sees full batches instead of one small batch per session.
     """
-    detector = load_detector_model()
-    sentences = sent_tokenize(text)
-    results = detector(sentences, truncation=True)
 
-    classification_map = {}
-    counts = {
-        "AI-generated": 0,
-        "AI-generated & AI-refined": 0,
-        "Human-written": 0,
-        "Human-written & AI-refined": 0
-    }
+    def __init__(self, detector, max_batch=64, window=0.02):
+        self._detector = detector
+        self._max_batch = max_batch
+        self._window = window
+        self._queue = queue.Queue()
+        self._worker = threading.Thread(target=self._loop, daemon=True)
+        self._worker.start()
+
+    def classify(self, sentences):
+        """Block until results for `sentences` are available."""
+        future = Future()
+        self._queue.put((list(sentences), future))
+        return future.result()
+
+    def _loop(self):
+        while True:
+            batch = [self._queue.get()]
+            size = len(batch[0][0])
+            deadline = time.monotonic() + self._window
+            while size < self._max_batch:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                batch.append(item)
+                size += len(item[0])
+
+            flat = [s for sentences, _ in batch for s in sentences]
+            try:
+                results = self._detector(flat, truncation=True,
+                                         batch_size=self._max_batch)
+            except Exception as exc:
+                for _, future in batch:
+                    future.set_exception(exc)
+                continue
+            offset = 0
+            for sentences, future in batch:
+                future.set_result(results[offset:offset + len(sentences)])
+                offset += len(sentences)
+
 
-    for sentence, result in zip(sentences, results):
-        label = result['label'].upper()  # "FAKE" or "REAL"
-        score = result['score']
-        if label == "FAKE":
-            if score >= threshold:
-                new_label = "AI-generated"
-            else:
-                new_label = "AI-generated & AI-refined"
-        elif label == "REAL":
-            if score >= threshold:
-                new_label = "Human-written"
-            else:
-                new_label = "Human-written & AI-refined"
-        else:
-            new_label = "Human-written"
-        classification_map[sentence] = new_label
-        counts[new_label] += 1
+@st.cache_resource
+def get_batched_detector():
+    """One shared BatchedDetector per server process."""
+    return BatchedDetector(load_detector_model())
 
+
+def _label_result(result, threshold):
+    """Map a raw detector result to one of the four display categories."""
+    label = result['label'].upper()  # "FAKE" or "REAL"
+    score = result['score']
+    if label == "FAKE":
+        if score >= threshold:
+            return "AI-generated"
+        return "AI-generated & AI-refined"
+    elif label == "REAL":
+        if score >= threshold:
+            return "Human-written"
+        return "Human-written & AI-refined"
+    return "Human-written"
+
+
+def percentages_from_map(classification_map):
+    """Compute per-category percentages from a {sentence: label} map."""
+    counts = {cat: 0 for cat in _CATEGORIES}
+    for label in classification_map.values():
+        counts[label] += 1
     total = sum(counts.values())
-    percentages = {
-        cat: round((count / total)*100, 2) if total > 0 else 0
+    return {
+        cat: round((count / total) * 100, 2) if total > 0 else 0
         for cat, count in counts.items()
     }
-    return classification_map, percentages
+
+
+def classify_text_hf_stream(text, threshold=0.8, batch_size=_BATCH_SIZE):
+    """Classify sentences batch-by-batch, yielding progress as it goes.
+
+    Yields (batch_map, done, total) tuples so the UI can show partial
+    results while the detector is still working through the document.
+    """
+    detector = get_batched_detector()
+    sentences = sent_tokenize(text)
+    total = len(sentences)
+    done = 0
+    for start in range(0, total, batch_size):
+        batch = sentences[start:start + batch_size]
+        results = detector.classify(batch)
+        batch_map = {
+            sentence: _label_result(result, threshold)
+            for sentence, result in zip(batch, results)
+        }
+        done += len(batch)
+        yield batch_map, done, total
+
+
+@st.cache_data(show_spinner=False)
+def classify_text_hf(text, threshold=0.8):
+    """
+    Splits text into sentences, uses roberta-base-openai-detector to classify each sentence
+    as AI-generated or human-written, returning a map of {sentence: label} and overall percentages.
+    """
+    classification_map = {}
+    for batch_map, _, _ in classify_text_hf_stream(text, threshold=threshold):
+        classification_map.update(batch_map)
+    return classification_map, percentages_from_map(classification_map)
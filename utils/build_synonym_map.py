@@ -0,0 +1,46 @@
+# utils/build_synonym_map.py
+"""Build a flat (word, pos) -> synonyms pickle from WordNet.
+
+NLTK's WordNet reader opens several data files and walks lemma indexes on
+every synsets() call. Inverting all synsets once into a plain dict lets the
+humanizer consult an in-memory mapping in its hot path instead. Run this
+once after downloading the WordNet corpus:
+
+    python -m utils.build_synonym_map
+"""
+import pickle
+
+from nltk.corpus import wordnet
+
+SYNONYMS_FILE = "synonyms.pkl"
+
+
+def build_synonym_map():
+    """Walk all synsets once and invert them into a lemma-keyed dict.
+
+    Keys are (lemma_lower, pos_char) where pos_char is one of WordNet's
+    'a'/'n'/'v'/'r'; satellite adjectives ('s') are folded into 'a'.
+    """
+    collected = {}
+    for syn in wordnet.all_synsets():
+        pos = 'a' if syn.pos() == 's' else syn.pos()
+        lemma_names = [lemma.name().replace("_", " ")
+                       for lemma in syn.lemmas()]
+        for name in lemma_names:
+            key = (name.lower(), pos)
+            bucket = collected.setdefault(key, [])
+            for other in lemma_names:
+                if other.lower() != name.lower() and other not in bucket:
+                    bucket.append(other)
+    return {key: tuple(names) for key, names in collected.items()}
+
+
+def main():
+    syn_map = build_synonym_map()
+    with open(SYNONYMS_FILE, "wb") as fh:
+        pickle.dump(syn_map, fh, protocol=pickle.HIGHEST_PROTOCOL)
+    print(f"Wrote {len(syn_map)} entries to {SYNONYMS_FILE}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,91 +1,414 @@
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+
 import streamlit as st
 import nltk
 import re
-from nltk.tokenize import sent_tokenize, word_tokenize
 from transformers import pipeline
 
-
-# Make sure NLTK resources are downloaded
+# Optional C-backed sentence splitter, ~10-30x faster than Punkt
 try:
-    nltk.data.find('tokenizers/punkt')
-except LookupError:
-    nltk.download('punkt', quiet=True)
+    import blingfire
+except ImportError:
+    blingfire = None
 
 # CITATION_REGEX: attempts to match something like (Smith et al., 2023, pp. 10-12)
+# The author segment deliberately avoids \s inside the character class: the
+# old pattern's overlapping \s classes and surrounding \s* could backtrack
+# catastrophically on long non-matching parenthesized text. Commas stay in
+# the class so multi-author citations like (Smith, Jones, & Lee, 2020)
+# keep matching; the lazy quantifier still stops at the year comma.
 CITATION_REGEX = re.compile(
-    r"\(\s*[A-Za-z&\-,\.\s]+(?:et al\.\s*)?,\s*\d{4}(?:,\s*(?:pp?\.\s*\d+(?:-\d+)?))?\s*\)"
+    r"\([A-Za-z&.,\- ]+?(?: et al\.)?,\s*\d{4}(?:,\s*pp?\.\s*\d+(?:-\d+)?)?\)",
+    re.ASCII,
 )
 
+T5_MODEL_ID = "google/flan-t5-base"
+# Directory caching the one-time ONNX export of the T5 model
+_T5_ONNX_DIR = "flan-ort"
+
+
+def _load_t5_onnx():
+    """CPU path: flan-t5-base exported to ONNX Runtime.
+
+    ORT's graph-level fusions (MatMul+Add+GELU etc.) are typically 2-4x
+    faster than eager PyTorch for CPU seq2seq inference. The export runs
+    once and is reloaded from disk afterwards.
+    """
+    from optimum.onnxruntime import ORTModelForSeq2SeqLM
+    from transformers import AutoTokenizer
+
+    if os.path.isdir(_T5_ONNX_DIR):
+        model = ORTModelForSeq2SeqLM.from_pretrained(_T5_ONNX_DIR)
+    else:
+        model = ORTModelForSeq2SeqLM.from_pretrained(
+            T5_MODEL_ID, export=True, provider="CPUExecutionProvider")
+        model.save_pretrained(_T5_ONNX_DIR)
+    tokenizer = AutoTokenizer.from_pretrained(T5_MODEL_ID)
+    return pipeline("text2text-generation", model=model, tokenizer=tokenizer)
+
+
 @st.cache_resource
 def load_t5_model():
     """
     Load T5-based text2text-generation model (e.g. google/flan-t5-base) once, for speed.
+
+    On CPU-only hosts the ONNX Runtime export is preferred when optimum is
+    installed, with int8-quantized PyTorch as the fallback. On GPU the
+    weights come in as bfloat16, halving the bytes the autoregressive
+    decoder loop moves per step, and the forward pass is torch.compile'd
+    (falling back to eager on older torch builds).
     """
-    return pipeline("text2text-generation", model="google/flan-t5-base")
+    import torch
+    from transformers import AutoModelForSeq2SeqLM, AutoTokenizer
+
+    if torch.cuda.is_available():
+        tokenizer = AutoTokenizer.from_pretrained(T5_MODEL_ID)
+        model = AutoModelForSeq2SeqLM.from_pretrained(
+            T5_MODEL_ID, torch_dtype=torch.bfloat16)
+        try:
+            model = torch.compile(model, mode="reduce-overhead")
+        except Exception:
+            pass  # torch < 2.0 or unsupported backend; run eager
+        return pipeline("text2text-generation", model=model,
+                        tokenizer=tokenizer, device=0)
+
+    try:
+        return _load_t5_onnx()
+    except ImportError:
+        pass  # optimum/onnxruntime not installed; use PyTorch
+
+    # CPU fallback: dynamically quantize the Linear layers to int8. The
+    # fp32 weights are ~1 GB and decoder matmuls are bandwidth-bound, so
+    # 4x smaller weights means 4x less memory traffic per token, with
+    # VNNI int8 GEMMs where the CPU provides them. (bf16 buys little on
+    # CPUs without AVX512-BF16, hence fp32 + int8 here.)
+    tokenizer = AutoTokenizer.from_pretrained(T5_MODEL_ID)
+    model = AutoModelForSeq2SeqLM.from_pretrained(T5_MODEL_ID)
+    model = torch.ao.quantization.quantize_dynamic(
+        model, {torch.nn.Linear}, dtype=torch.qint8)
+    return pipeline("text2text-generation", model=model,
+                    tokenizer=tokenizer, device=-1)
+
+T5_ASSISTANT_MODEL_ID = "google/flan-t5-small"
+
+
+@st.cache_resource
+def load_assistant_model():
+    """Load the small draft model used for assisted generation."""
+    import torch
+    from transformers import AutoModelForSeq2SeqLM
+
+    return AutoModelForSeq2SeqLM.from_pretrained(
+        T5_ASSISTANT_MODEL_ID, torch_dtype=torch.bfloat16)
+
+
+@st.cache_resource
+def _punkt():
+    """Load the Punkt sentence tokenizer once; sent_tokenize pays the
+    pickle load and setup on every call. The availability probe lives
+    here too, so importing this module costs no nltk_data path scan, and
+    an env-var sentinel skips the probe entirely on later interpreter
+    starts (Streamlit restarts, spawned workers) on the same host."""
+    if os.environ.get("PUNKT_READY") != "1":
+        try:
+            nltk.data.find('tokenizers/punkt')
+        except LookupError:
+            nltk.download('punkt', quiet=True)
+        os.environ["PUNKT_READY"] = "1"
+    return nltk.data.load('tokenizers/punkt/english.pickle')
+
+def split_sentences(text):
+    """Sentence-split via blingfire when installed, else cached Punkt."""
+    if blingfire is not None:
+        return blingfire.text_to_sentences(text).split("\n")
+    return _punkt().tokenize(text)
 
 def extract_citations(text):
     """
     Replace APA-like references with placeholders [[REF_1]], [[REF_2]], etc.
-    Returns replaced_text and placeholder_map.
+    Returns replaced_text and placeholder_map. One substitution pass rather
+    than findall plus a full-text str.replace per reference.
     """
-    refs = CITATION_REGEX.findall(text)
     placeholder_map = {}
-    replaced_text = text
-    for i, r in enumerate(refs, start=1):
-        placeholder = f"[[REF_{i}]]"
-        placeholder_map[placeholder] = r
-        replaced_text = replaced_text.replace(r, placeholder, 1)
+
+    def _sub(match):
+        placeholder = f"[[REF_{len(placeholder_map) + 1}]]"
+        placeholder_map[placeholder] = match.group(0)
+        return placeholder
+
+    replaced_text = CITATION_REGEX.sub(_sub, text)
     return replaced_text, placeholder_map
 
+# Placeholders have the fixed shape [[REF_<i>]], so one compiled pattern
+# covers them all without building a per-request alternation. re.ASCII
+# keeps \d and \s on the fast byte-class checks: citation years, page
+# numbers, and placeholder indices are ASCII by construction, and without
+# the flag the engine consults full Unicode property tables per character.
+PLACEHOLDER_REGEX = re.compile(r"\[\[REF_(\d+)\]\]", re.ASCII)
+
+
 def restore_citations(text, placeholder_map):
     """
-    Put original references back into the text.
+    Put original references back into the text in a single scan, instead of
+    one full-text str.replace pass per placeholder.
     """
-    restored = text
-    for placeholder, ref_text in placeholder_map.items():
-        restored = restored.replace(placeholder, ref_text)
-    return restored
+    return PLACEHOLDER_REGEX.sub(
+        lambda m: placeholder_map.get(m.group(0), m.group(0)), text)
+
+# Sentences that are only citation placeholders need no rewriting
+_PLACEHOLDER_ONLY_REGEX = re.compile(r"^(?:\s*\[\[REF_\d+\]\]\s*)+$",
+                                     re.ASCII)
 
-def sentence_level_rewrite(text, t5_pipeline, min_len=0, max_len=512):
+
+def _needs_rewrite(sentence):
+    """Cheap gate so headers, fragments, and citation-only lines skip T5."""
+    if len(sentence.split()) < 4:
+        return False
+    if _PLACEHOLDER_ONLY_REGEX.match(sentence):
+        return False
+    return True
+
+
+REWRITE_PROMPT = (
+    "Rewrite this sentence to sound more natural and human while preserving details.\n\n"
+    "Original: "
+)
+
+
+@st.cache_resource
+def _prompt_prefix_ids(_tokenizer):
+    """Token ids of the shared instruction prefix, tokenized once.
+
+    Every prompt starts with the same instruction, so tokenizing it per
+    sentence and per request is repeated work. Reusing the encoder hidden
+    states for the prefix (Prompt-Cache style) was considered but rejected:
+    T5's encoder attends bidirectionally, so the prefix states depend on
+    the sentence that follows. Caching the ids is the part that is exact.
     """
-    Splits text by sentences, rewrites each with T5, then rejoins.
+    return _tokenizer(REWRITE_PROMPT, add_special_tokens=False)["input_ids"]
+
+
+def _rewrite_sentences(sentences, t5_pipeline, max_len=512, batch_size=8):
+    """Rewrite pre-split sentences in batched model.generate calls.
+
+    The pipeline object only serves as the cached (model, tokenizer)
+    holder here: its __call__ re-validates arguments, builds a DataLoader,
+    and re-tokenizes every prompt per request, so the batched path goes to
+    tokenizer.pad + model.generate directly. Prompt ids are assembled from
+    the cached instruction-prefix ids plus the per-sentence ids, so the
+    prefix is never retokenized either.
     """
-    sentences = sent_tokenize(text)
-    out_sents = []
-    for sent in sentences:
-        if not sent.strip():
-            continue
-        prompt = (
-            "Rewrite this sentence to sound more natural and human while preserving details.\n\n"
-            f"Original: {sent}"
+    if not sentences:
+        return []
+    tokenizer = t5_pipeline.tokenizer
+    model = t5_pipeline.model
+    # Budget generation from the actual input length: a paraphrase is about
+    # as long as its source, so there is no point letting the decoder run
+    # to a fixed 512 tokens for a ten-token sentence.
+    prefix = _prompt_prefix_ids(tokenizer)
+    sent_budget = max_len - len(prefix) - 1
+    sentence_ids = [
+        ids[:sent_budget]
+        for ids in tokenizer(sentences, add_special_tokens=False)["input_ids"]
+    ]
+    input_lens = [len(prefix) + len(ids) + 1 for ids in sentence_ids]
+    max_new = min(max_len, int(1.3 * max(input_lens)) + 8)
+    # Assisted generation only works at batch size 1 and on the PyTorch
+    # backend; when there is a single sentence anyway, let the draft model
+    # speculate tokens.
+    is_torch_model = "optimum" not in type(model).__module__
+    if len(sentences) == 1 and is_torch_model:
+        return [_rewrite_single_assisted(
+            sentence_ids[0], t5_pipeline, max_new)]
+    eos = tokenizer.eos_token_id
+    rewritten = []
+    for start in range(0, len(sentences), batch_size):
+        batch = sentence_ids[start:start + batch_size]
+        enc = tokenizer.pad(
+            [{"input_ids": prefix + list(ids) + [eos]} for ids in batch],
+            return_tensors="pt").to(model.device)
+        out = model.generate(
+            **enc,
+            do_sample=False,   # beam search, deterministic
+            num_beams=2,
+            early_stopping=True,
+            max_new_tokens=max_new,
         )
-        res = t5_pipeline(
-            prompt,
-            do_sample=False,       # beam search, deterministic
-            num_beams=4,
-            min_length=max(min_len, len(word_tokenize(sent))),
-            max_length=max_len,
-            max_new_tokens=max_len
+        rewritten.extend(
+            text.strip()
+            for text in tokenizer.batch_decode(out, skip_special_tokens=True)
         )
-        new_sent = res[0]["generated_text"].strip()
-        out_sents.append(new_sent)
-    return " ".join(out_sents)
+    return rewritten
+
+def _rewrite_single_assisted(sentence_ids, t5_pipeline, max_new):
+    """Greedy-decode one pre-tokenized sentence with the draft model.
+
+    The prompt is assembled from the cached prefix ids plus the sentence
+    ids. The flan-t5-small draft proposes several tokens which the main
+    model verifies in a single forward pass (speculative decoding),
+    cutting the number of sequential large-model steps.
+    """
+    import torch
+
+    tokenizer = t5_pipeline.tokenizer
+    model = t5_pipeline.model
+    ids = (_prompt_prefix_ids(tokenizer) + list(sentence_ids)
+           + [tokenizer.eos_token_id])
+    input_ids = torch.tensor([ids], device=model.device)
+    out = model.generate(
+        input_ids=input_ids,
+        assistant_model=load_assistant_model().to(model.device),
+        do_sample=False,
+        max_new_tokens=max_new,
+    )
+    return tokenizer.batch_decode(out, skip_special_tokens=True)[0].strip()
+
+# Cross-request memo of finished rewrites. Decoding is deterministic
+# (do_sample=False), so hits are exact. FIFO-capped to bound memory.
+_rewrite_cache = {}
+_REWRITE_CACHE_MAX = 4096
+
 
-def minimal_humanize_text(text):
+def _cache_rewrite(sentence, rewritten):
+    if len(_rewrite_cache) >= _REWRITE_CACHE_MAX:
+        _rewrite_cache.pop(next(iter(_rewrite_cache)))
+    _rewrite_cache[sentence] = rewritten
+
+
+def _iter_rewritten(sentences, t5_pipeline, max_len=512, batch_size=8,
+                    max_workers=None):
+    """Yield rewritten sentences in document order as buckets finish.
+
+    Sentences failing the _needs_rewrite gate pass through untouched, and
+    duplicates (boilerplate, repeated headings) are decoded once. The
+    unseen uniques of the whole document are sorted by length and decoded
+    in buckets of batch_size, so each padded batch holds sentences of
+    similar length and its max_new_tokens budget stays tight. After each
+    finished bucket, every leading sentence whose rewrite is now known is
+    released, so output starts flowing before the document is done.
+
+    With `max_workers` > 1, buckets are overlapped on a thread pool: on
+    GPU the stream scheduler interleaves the small kernels, and on CPU
+    torch's intra-op threads are capped for the duration of the request
+    (and restored after) to avoid oversubscription.
     """
-    Minimal rewriting approach:
-    1) Rewrite each sentence with T5 without replacing references so they remain unchanged.
+    hard = {s for s in sentences if _needs_rewrite(s)}
+    # Snapshot shared-memo hits locally: concurrent sessions may evict
+    # entries from _rewrite_cache mid-request.
+    done = {s: _rewrite_cache[s] for s in hard if s in _rewrite_cache}
+    unique = sorted(dict.fromkeys(
+        s for s in sentences if s in hard and s not in done), key=len)
+    buckets = [unique[i:i + batch_size]
+               for i in range(0, len(unique), batch_size)]
+
+    emitted = 0
+
+    def _drain():
+        nonlocal emitted
+        while emitted < len(sentences):
+            sent = sentences[emitted]
+            if sent in hard and sent not in done:
+                return
+            yield done[sent] if sent in hard else sent
+            emitted += 1
+
+    def _decode(bucket):
+        return _rewrite_sentences(bucket, t5_pipeline,
+                                  max_len=max_len, batch_size=batch_size)
+
+    def _absorb(bucket, fresh):
+        for orig, rew in zip(bucket, fresh):
+            done[orig] = rew
+            _cache_rewrite(orig, rew)
+
+    yield from _drain()
+    if max_workers and max_workers > 1 and len(buckets) > 1:
+        import torch
+
+        prev_threads = torch.get_num_threads()
+        torch.set_num_threads(max(1, (os.cpu_count() or 1) // max_workers))
+        try:
+            with ThreadPoolExecutor(max_workers=max_workers) as ex:
+                for bucket, fresh in zip(buckets, ex.map(_decode, buckets)):
+                    _absorb(bucket, fresh)
+                    yield from _drain()
+        finally:
+            torch.set_num_threads(prev_threads)
+    else:
+        for bucket in buckets:
+            _absorb(bucket, _decode(bucket))
+            yield from _drain()
+
+def _stream_rewrites(sentences, t5_pipeline, max_len=512, batch_size=8,
+                     max_workers=None):
+    """Yield rewritten sentences as each decoder batch completes.
+
+    Total decoder work is unchanged; the point is that the first sentences
+    become available as soon as their rewrites are decoded rather than
+    after the whole document. Separating spaces are interleaved so the
+    pieces concatenate into the final text.
     """
-    # Directly rewrite the original text so citations/references remain intact.
+    first = True
+    for sent in _iter_rewritten(sentences, t5_pipeline,
+                                max_len=max_len, batch_size=batch_size,
+                                max_workers=max_workers):
+        yield sent if first else " " + sent
+        first = False
+
+def humanize_stream(text, max_len=512, batch_size=8, max_workers=None):
+    """Generator over the rewritten text, suitable for st.write_stream."""
     t5 = load_t5_model()
-    rewritten = sentence_level_rewrite(text, t5)
-    return rewritten
+    sentences = [s for s in split_sentences(text) if s.strip()]
+    yield from _stream_rewrites(sentences, t5,
+                                max_len=max_len, batch_size=batch_size,
+                                max_workers=max_workers)
+
+def sentence_level_rewrite(text, t5_pipeline, max_len=512, batch_size=8,
+                           max_workers=None):
+    """
+    Splits text by sentences, rewrites them all in one batched T5 call,
+    then rejoins.
+    """
+    sentences = [s for s in split_sentences(text) if s.strip()]
+    # Write straight into one buffer; the stream already interleaves the
+    # separating spaces, so no list of N sentence strings is kept around
+    # just to join it at the end.
+    buf = io.StringIO()
+    for piece in _stream_rewrites(sentences, t5_pipeline,
+                                  max_len=max_len, batch_size=batch_size,
+                                  max_workers=max_workers):
+        buf.write(piece)
+    return buf.getvalue()
+
+# Hashes of inputs whose full output already sits in the st.cache_data
+# store, so the page knows whether to render the cached string or stream
+# a fresh rewrite. Populated only on cache misses, so it lives and dies
+# with the per-process cache itself.
+_humanized_keys = set()
+
+
+@st.cache_data(show_spinner=False)
+def _cached_humanize(text, max_len=512, batch_size=8):
+    """Full-request cache keyed by a hash of the input text.
+
+    Decoding is deterministic (do_sample=False), so the same input always
+    yields the same output; a repeated paste returns from the cache
+    without touching the model at all.
+    """
+    _humanized_keys.add(hash(text))
+    return sentence_level_rewrite(text, load_t5_model(),
+                                  max_len=max_len, batch_size=batch_size)
 
 def count_words(text):
-    return len(word_tokenize(text))
+    # Whitespace split rather than word_tokenize: the stats don't need
+    # punctuation-level tokens, and word_tokenize would be the only path
+    # still requiring punkt data when blingfire handles the splitting.
+    return len(text.split())
 
 def count_sentences(text):
-    return len(sent_tokenize(text))
+    return len(split_sentences(text))
 
 ###############################################
 # Streamlit App
@@ -103,16 +426,22 @@ def main():
         
         original_wordcount = count_words(input_text)
         original_sentcount = count_sentences(input_text)
-        
-        with st.spinner("Rewriting text..."):
-            out_text = minimal_humanize_text(input_text)
+
+        # A repeated input renders instantly from the whole-request cache;
+        # a fresh one streams into the page as batches finish decoding,
+        # then seeds the cache (a cheap re-join, since every sentence is
+        # already in the per-sentence memo by then).
+        st.subheader("Rewritten Output")
+        if hash(input_text) in _humanized_keys:
+            out_text = _cached_humanize(input_text)
+            st.write(out_text)
+        else:
+            out_text = st.write_stream(humanize_stream(input_text))
+            _cached_humanize(input_text)
 
         new_wordcount = count_words(out_text)
         new_sentcount = count_sentences(out_text)
 
-        st.subheader("Rewritten Output")
-        st.text_area("Humanized Text", out_text, height=200)
-
         col1, col2 = st.columns(2)
         with col1:
             st.markdown(f"**Original Word Count:** {original_wordcount}")
@@ -2,12 +2,14 @@
 import fitz
 from io import BytesIO
 import nltk
+import streamlit as st
 from nltk.tokenize import sent_tokenize, word_tokenize
 
 nltk.download('punkt', quiet=True)
 
+@st.cache_data(show_spinner=False)
 def extract_text_from_pdf(pdf_bytes):
-    """Extract text from all pages of a PDF."""
+    """Extract text from all pages of a PDF. Cached on the PDF bytes."""
     doc = fitz.open(stream=pdf_bytes, filetype="pdf")
     all_text = ""
     for page in doc: